@@ -0,0 +1,335 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional
+
+logger = logging.getLogger("pdn_history")
+
+# Ключ агрегатов: (день, риск-бенд, режим сценария, валюта)
+ROLLUP_KEY = ("day", "risk_band", "scenario_mode", "currency")
+
+
+class ResultStore(ABC):
+    """
+    Интерфейс хранилища результатов расчёта.
+    Бэкенд обязан атомарно записывать пачку результатов вместе с приращением агрегатов.
+    """
+
+    @abstractmethod
+    def write_batch(self, records: List[dict], rollups: Dict[tuple, dict]) -> None:
+        ...
+
+    @abstractmethod
+    def get_results(self, request_id: Optional[str] = None, limit: int = 100) -> List[dict]:
+        ...
+
+    @abstractmethod
+    def get_rollups(self, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                    **filters) -> List[dict]:
+        ...
+
+    @abstractmethod
+    def close(self) -> None:
+        """Освобождает соединения бэкенда."""
+
+
+class SQLiteResultStore(ResultStore):
+    """
+    Локальное хранилище результатов в SQLite.
+    Файл базы открывается при первом обращении, а не при создании объекта.
+    """
+
+    def __init__(self, path: str = "pdn_history.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """Возвращает соединение, создавая базу и схему при необходимости. Вызывается под self._lock."""
+        if self._conn is not None:
+            return self._conn
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        with conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS pdn_results (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    request_id TEXT,
+                    ts TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    calc_version TEXT,
+                    scenario_mode TEXT NOT NULL,
+                    currency TEXT NOT NULL,
+                    risk_band TEXT NOT NULL,
+                    pdn_percent REAL NOT NULL,
+                    monthly_income_used REAL,
+                    monthly_obligations_total REAL,
+                    breakdown TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_pdn_results_request_id ON pdn_results (request_id);
+                CREATE TABLE IF NOT EXISTS pdn_rollups (
+                    day TEXT NOT NULL,
+                    risk_band TEXT NOT NULL,
+                    scenario_mode TEXT NOT NULL,
+                    currency TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    pdn_percent_sum REAL NOT NULL,
+                    monthly_income_sum REAL NOT NULL,
+                    monthly_obligations_sum REAL NOT NULL,
+                    PRIMARY KEY (day, risk_band, scenario_mode, currency)
+                );
+            """)
+        self._conn = conn
+        return conn
+
+    def write_batch(self, records: List[dict], rollups: Dict[tuple, dict]) -> None:
+        with self._lock, self._connection() as conn:
+            conn.executemany(
+                """
+                INSERT INTO pdn_results (request_id, ts, day, calc_version, scenario_mode, currency,
+                    risk_band, pdn_percent, monthly_income_used, monthly_obligations_total, breakdown)
+                VALUES (:request_id, :ts, :day, :calc_version, :scenario_mode, :currency,
+                    :risk_band, :pdn_percent, :monthly_income_used, :monthly_obligations_total, :breakdown)
+                """,
+                [{**r, "breakdown": json.dumps(r["breakdown"], ensure_ascii=False)} for r in records],
+            )
+            conn.executemany(
+                """
+                INSERT INTO pdn_rollups (day, risk_band, scenario_mode, currency, count,
+                    pdn_percent_sum, monthly_income_sum, monthly_obligations_sum)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (day, risk_band, scenario_mode, currency) DO UPDATE SET
+                    count = count + excluded.count,
+                    pdn_percent_sum = pdn_percent_sum + excluded.pdn_percent_sum,
+                    monthly_income_sum = monthly_income_sum + excluded.monthly_income_sum,
+                    monthly_obligations_sum = monthly_obligations_sum + excluded.monthly_obligations_sum
+                """,
+                [
+                    (*key, agg["count"], agg["pdn_percent_sum"], agg["monthly_income_sum"],
+                     agg["monthly_obligations_sum"])
+                    for key, agg in rollups.items()
+                ],
+            )
+
+    def get_results(self, request_id: Optional[str] = None, limit: int = 100) -> List[dict]:
+        query = "SELECT * FROM pdn_results"
+        params: list = []
+        if request_id:
+            query += " WHERE request_id = ?"
+            params.append(request_id)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._connection().execute(query, params).fetchall()
+        results = []
+        for row in rows:
+            item = dict(row)
+            item["breakdown"] = json.loads(item["breakdown"]) if item["breakdown"] else []
+            results.append(item)
+        return results
+
+    def get_rollups(self, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                    **filters) -> List[dict]:
+        conditions, params = [], []
+        if date_from:
+            conditions.append("day >= ?")
+            params.append(date_from)
+        if date_to:
+            conditions.append("day <= ?")
+            params.append(date_to)
+        for field in ("risk_band", "scenario_mode", "currency"):
+            if filters.get(field):
+                conditions.append(f"{field} = ?")
+                params.append(filters[field])
+        query = "SELECT * FROM pdn_rollups"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY day, risk_band, scenario_mode, currency"
+        with self._lock:
+            return [dict(row) for row in self._connection().execute(query, params).fetchall()]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class HistoryRecorder:
+    """
+    Буферизует результаты расчётов и пишет их в хранилище пачками.
+    Агрегаты по (день, риск-бенд, сценарий, валюта) считаются в памяти для пачки
+    и применяются к хранилищу инкрементально вместе с самими строками.
+
+    record() только кладёт результат в буфер. Запись выполняет фоновый поток:
+    при накоплении batch_size результатов или не реже раза в max_delay секунд.
+    Ошибки хранилища логируются, а пачка возвращается в буфер (не больше max_buffer записей).
+    """
+
+    def __init__(self, store: ResultStore, batch_size: int = 100, max_delay: float = 5.0,
+                 max_buffer: int = 100_000):
+        self.store = store
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.max_buffer = max_buffer
+        self._buffer: List[dict] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, record: dict) -> None:
+        """Добавляет результат в буфер и при необходимости будит фоновую запись."""
+        with self._lock:
+            self._buffer.append(record)
+            full = len(self._buffer) >= self.batch_size
+            if self._thread is None and not self._stopped.is_set():
+                self._thread = threading.Thread(target=self._run, name="pdn-history-flusher", daemon=True)
+                self._thread.start()
+        if full:
+            self._wakeup.set()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.max_delay)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Записывает накопленные результаты. Возвращает число записанных строк.
+        При ошибке хранилища пачка возвращается в буфер, исключение не пробрасывается.
+        """
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return 0
+        try:
+            self.store.write_batch(batch, aggregate(batch))
+        except Exception:
+            logger.exception("Failed to write %d calculation results, will retry", len(batch))
+            with self._lock:
+                self._buffer = batch + self._buffer
+                dropped = len(self._buffer) - self.max_buffer
+                if dropped > 0:
+                    del self._buffer[:dropped]
+                    logger.error("History buffer is full, dropped %d oldest results", dropped)
+            return 0
+        return len(batch)
+
+    def close(self) -> None:
+        """Останавливает фоновую запись, сбрасывает остаток буфера и закрывает хранилище."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        self.store.close()
+
+    def rollups(self, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                **filters) -> List[dict]:
+        self.flush()
+        return self.store.get_rollups(
+            date_from.isoformat() if date_from else None,
+            date_to.isoformat() if date_to else None,
+            **filters,
+        )
+
+    def results(self, request_id: Optional[str] = None, limit: int = 100) -> List[dict]:
+        self.flush()
+        return self.store.get_results(request_id, limit)
+
+    def band_shares(self, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                    **filters) -> dict:
+        """Доли риск-бендов за период, посчитанные только по агрегатам."""
+        counts: Dict[str, int] = defaultdict(int)
+        for row in self.rollups(date_from, date_to, **filters):
+            counts[row["risk_band"]] += row["count"]
+        total = sum(counts.values())
+        return {
+            "total": total,
+            "bands": {
+                band: {"count": count, "share": round(count / total, 4)}
+                for band, count in sorted(counts.items())
+            },
+        }
+
+
+def aggregate(records: List[dict]) -> Dict[tuple, dict]:
+    """Сворачивает пачку результатов в приращения агрегатов."""
+    rollups: Dict[tuple, dict] = {}
+    for r in records:
+        key = tuple(r[k] for k in ROLLUP_KEY)
+        agg = rollups.setdefault(key, {
+            "count": 0, "pdn_percent_sum": 0.0, "monthly_income_sum": 0.0, "monthly_obligations_sum": 0.0,
+        })
+        agg["count"] += 1
+        agg["pdn_percent_sum"] += r["pdn_percent"]
+        agg["monthly_income_sum"] += r["monthly_income_used"] or 0
+        agg["monthly_obligations_sum"] += r["monthly_obligations_total"] or 0
+    return rollups
+
+
+def make_record(request_id: Optional[str], ts: str, calc_version: str, scenario_mode: str, currency: str,
+                risk_band: str, pdn_percent: float, monthly_income_used: Optional[float] = None,
+                monthly_obligations_total: Optional[float] = None,
+                breakdown: Optional[list] = None) -> dict:
+    """Формирует запись истории. client_id не сохраняется (персональные данные)."""
+    return {
+        "request_id": request_id,
+        "ts": ts,
+        "day": ts[:10],
+        "calc_version": calc_version,
+        "scenario_mode": scenario_mode,
+        "currency": currency,
+        "risk_band": risk_band,
+        "pdn_percent": pdn_percent,
+        "monthly_income_used": monthly_income_used,
+        "monthly_obligations_total": monthly_obligations_total,
+        "breakdown": breakdown or [],
+    }
+
+
+def pdn_record(request, response: dict) -> dict:
+    """Запись истории по запросу PDNRequestSchema и ответу calculate_pdn."""
+    return make_record(
+        request_id=request.meta.request_id,
+        ts=response["meta"]["ts"],
+        calc_version=response["calc_version"],
+        scenario_mode=request.scenario.mode,
+        currency=response["currency"],
+        risk_band=response["risk_band"],
+        pdn_percent=response["pdn_percent"],
+        monthly_income_used=response["monthly_income_used"],
+        monthly_obligations_total=response["monthly_obligations_total"],
+        breakdown=response["breakdown"],
+    )
+
+
+def business_record(data, result) -> dict:
+    """Запись истории по BusinessInput и BusinessResult."""
+    return make_record(
+        request_id=result.meta.request_id,
+        ts=datetime.now(timezone.utc).isoformat(),
+        calc_version=result.calc_version,
+        scenario_mode="business",
+        currency=data.currency,
+        risk_band=result.risk_band,
+        pdn_percent=result.pdn_business_percent,
+        monthly_income_used=result.cash_flow_proxy,
+        monthly_obligations_total=result.monthly_debt_service,
+    )
+
+
+# Хранилище по умолчанию; путь задаётся через PDN_HISTORY_DB. Файл создаётся при первой записи или чтении
+history = HistoryRecorder(
+    SQLiteResultStore(os.environ.get("PDN_HISTORY_DB", "pdn_history.db")),
+    batch_size=int(os.environ.get("PDN_HISTORY_BATCH_SIZE", "100")),
+    max_delay=float(os.environ.get("PDN_HISTORY_FLUSH_INTERVAL", "5")),
+)
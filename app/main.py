@@ -1,20 +1,30 @@
-from fastapi import FastAPI, Depends, HTTPException, Query, Request
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from slowapi import Limiter
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
-from slowapi.util import get_remote_address
 from pydantic import ValidationError
 from pathlib import Path
+from typing import Optional
+from datetime import date
 
 from app.models import PDNRequestSchema, BusinessInput, BusinessResult
 from app.services import calculate_pdn, calc_business_metrics, get_config, update_config
 from app.audit import get_audit_by_request
+from app.history import history, pdn_record, business_record
 from app.docs.openapi_overrides import custom_openapi
 from app.auth import require_admin
-from app.security import mask_sensitive  # Функция маскирования персональных данных в логах
+from app.transport import MsgPackRoute, MsgPackResponse, is_msgpack, msgpack_body, render
+from app.ratelimit import (
+    RATE_LIMIT_STORAGE_URI,
+    RATE_LIMIT_CALC,
+    RATE_LIMIT_ADMIN,
+    RATE_LIMIT_HEALTH,
+    SharedMemoryStorage,
+    client_address,
+)
 
 APP_VERSION = "v1.0"
 
@@ -30,12 +40,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# SlowAPI лимитирование
-limiter = Limiter(key_func=get_remote_address)
+# SlowAPI лимитирование (счётчики общие для всех воркеров, см. app.ratelimit)
+# Ключ — адрес клиента с учётом X-Forwarded-For от доверенного ingress
+limiter = Limiter(key_func=client_address, storage_uri=RATE_LIMIT_STORAGE_URI)
 app.state.limiter = limiter
 app.add_middleware(SlowAPIMiddleware)
 
 async def _rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
+    storage = limiter.limiter.storage
+    if isinstance(storage, SharedMemoryStorage):
+        storage.record_rejection()
     return JSONResponse(
         status_code=429,
         content={"detail": "Too many requests"}
@@ -53,15 +67,22 @@ app.mount("/static", StaticFiles(directory=static_dir), name="static")
 async def root():
     return FileResponse(static_dir / "index.html")
 
+# -----------------------
+# Расчётные маршруты (JSON и MessagePack)
+# -----------------------
+calc_router = APIRouter(route_class=MsgPackRoute)
+
 # -----------------------
 # Расчёт ПДН для физических лиц
 # -----------------------
-@app.post("/pdn/calc")
-async def pdn_calc(request: PDNRequestSchema):
+@calc_router.post("/pdn/calc")
+@limiter.limit(RATE_LIMIT_CALC)
+@msgpack_body("payload", PDNRequestSchema)
+async def pdn_calc(payload: PDNRequestSchema, request: Request):
     try:
-        masked_request = mask_sensitive(request.dict())
-        result = calculate_pdn(request)
-        return JSONResponse(content=result, headers={"X-PDN-Calc-Version": APP_VERSION})
+        result = calculate_pdn(payload)
+        history.record(pdn_record(payload, result))
+        return render(request, result, headers={"X-PDN-Calc-Version": APP_VERSION})
     except ValidationError as ve:
         raise HTTPException(status_code=400, detail=ve.errors())
     except ValueError as ve:
@@ -72,11 +93,16 @@ async def pdn_calc(request: PDNRequestSchema):
 # -----------------------
 # Расчёт ПДН для бизнеса
 # -----------------------
-@app.post("/pdn/calc/business", response_model=BusinessResult, tags=["Business PDN"])
-def pdn_calc_business(data: BusinessInput):
+@calc_router.post("/pdn/calc/business", response_model=BusinessResult, tags=["Business PDN"])
+@limiter.limit(RATE_LIMIT_CALC)
+@msgpack_body("data", BusinessInput)
+def pdn_calc_business(data: BusinessInput, request: Request):
     try:
-        masked_data = mask_sensitive(data.dict())
-        return calc_business_metrics(data)
+        result = calc_business_metrics(data)
+        history.record(business_record(data, result))
+        if is_msgpack(request.headers.get("accept")):
+            return MsgPackResponse(content=result.model_dump())
+        return result
     except ValidationError as ve:
         raise HTTPException(status_code=400, detail=ve.errors())
     except ValueError as ve:
@@ -84,6 +110,8 @@ def pdn_calc_business(data: BusinessInput):
     except Exception:
         raise HTTPException(status_code=500, detail="Internal calculation error")
 
+app.include_router(calc_router)
+
 # -----------------------
 # Конфигурация
 # -----------------------
@@ -92,14 +120,16 @@ def read_config():
     return JSONResponse(content=get_config(), headers={"X-PDN-Calc-Version": APP_VERSION})
 
 @app.post("/admin/pdn/config")
-def update_admin_config(new_conf: dict, _: None = Depends(require_admin)):
+@limiter.limit(RATE_LIMIT_ADMIN)
+def update_admin_config(new_conf: dict, request: Request, _: None = Depends(require_admin)):
     return JSONResponse(content=update_config(new_conf), headers={"X-PDN-Calc-Version": APP_VERSION})
 
 # -----------------------
 # Аудит
 # -----------------------
 @app.get("/admin/pdn/audit")
-def audit_logs(request_id: str = Query(..., description="ID запроса для поиска")):
+@limiter.limit(RATE_LIMIT_ADMIN)
+def audit_logs(request: Request, request_id: str = Query(..., description="ID запроса для поиска")):
     logs = get_audit_by_request(request_id)
     if not logs:
         return JSONResponse(
@@ -108,6 +138,64 @@ def audit_logs(request_id: str = Query(..., description="ID запроса дл
         )
     return JSONResponse(content={"request_id": request_id, "logs": logs}, headers={"X-PDN-Calc-Version": APP_VERSION})
 
+# -----------------------
+# История расчётов и аналитика портфеля
+# -----------------------
+@app.get("/admin/pdn/history")
+@limiter.limit(RATE_LIMIT_ADMIN)
+def history_results(
+    request: Request,
+    request_id: Optional[str] = Query(None, description="ID запроса"),
+    limit: int = Query(100, ge=1, le=1000),
+    _: None = Depends(require_admin),
+):
+    results = history.results(request_id=request_id, limit=limit)
+    return JSONResponse(content={"results": results}, headers={"X-PDN-Calc-Version": APP_VERSION})
+
+@app.get("/admin/pdn/analytics")
+@limiter.limit(RATE_LIMIT_ADMIN)
+def history_rollups(
+    request: Request,
+    date_from: Optional[date] = Query(None, description="Начало периода, YYYY-MM-DD"),
+    date_to: Optional[date] = Query(None, description="Конец периода, YYYY-MM-DD"),
+    risk_band: Optional[str] = Query(None),
+    scenario_mode: Optional[str] = Query(None),
+    currency: Optional[str] = Query(None),
+    _: None = Depends(require_admin),
+):
+    rollups = history.rollups(
+        date_from, date_to, risk_band=risk_band, scenario_mode=scenario_mode, currency=currency
+    )
+    return JSONResponse(content={"rollups": rollups}, headers={"X-PDN-Calc-Version": APP_VERSION})
+
+@app.get("/admin/pdn/analytics/bands")
+@limiter.limit(RATE_LIMIT_ADMIN)
+def history_band_shares(
+    request: Request,
+    date_from: Optional[date] = Query(None, description="Начало периода, YYYY-MM-DD"),
+    date_to: Optional[date] = Query(None, description="Конец периода, YYYY-MM-DD"),
+    scenario_mode: Optional[str] = Query(None),
+    currency: Optional[str] = Query(None),
+    _: None = Depends(require_admin),
+):
+    shares = history.band_shares(date_from, date_to, scenario_mode=scenario_mode, currency=currency)
+    return JSONResponse(content=shares, headers={"X-PDN-Calc-Version": APP_VERSION})
+
+@app.on_event("shutdown")
+def flush_history():
+    history.close()
+
+# -----------------------
+# Мониторинг rate limit
+# -----------------------
+@app.get("/admin/pdn/ratelimit")
+@limiter.limit(RATE_LIMIT_ADMIN)
+def rate_limit_stats(request: Request, _: None = Depends(require_admin)):
+    storage = limiter.limiter.storage
+    stats = storage.stats() if isinstance(storage, SharedMemoryStorage) else {"backend": type(storage).__name__}
+    stats["limits"] = {"calc": RATE_LIMIT_CALC, "admin": RATE_LIMIT_ADMIN, "health": RATE_LIMIT_HEALTH}
+    return JSONResponse(content=stats, headers={"X-PDN-Calc-Version": APP_VERSION})
+
 # -----------------------
 # Кастомное OpenAPI
 # -----------------------
@@ -117,7 +205,7 @@ app.openapi = lambda: custom_openapi(app)
 # Health check с лимитом
 # -----------------------
 @app.get("/health")
-@limiter.limit("10/minute")
+@limiter.limit(RATE_LIMIT_HEALTH)
 async def health_check(request: Request):
     return {"status": "ok"}
 
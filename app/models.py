@@ -40,7 +40,8 @@ class ScenarioSchema(BaseModel):
 # --------------------------
 class AssumptionsSchema(BaseModel):
     credit_card_default_min_rate: float = 0.05
-    rounding: int = 2
+    rounding: int = Field(2, ge=0, le=4)
+    rounding_mode: Optional[Literal["half_up", "half_even", "down"]] = None
 
 
 # --------------------------
@@ -150,7 +151,7 @@ CONFIG = {
         "mid": {"min": 50.0, "max": 80.0},
         "high": {"min": 80.0}
     },
-    "rounding": {"money": 2, "percent": 2},
+    "rounding": {"money": 2, "percent": 2, "mode": "half_up"},
     "credit_card": {"default_min_payment_rate": 0.05}
 }
 
@@ -0,0 +1,127 @@
+"""
+Денежная арифметика в целых минорных единицах (копейки/центы).
+
+Суммы хранятся как int (или numpy int64 для пачек) в масштабе 10**digits,
+ставки и коэффициенты — как целые в масштабе RATE_SCALE. Каждое округление
+выполняется целочисленным делением с явным режимом, поэтому скалярный и
+векторный пути дают побитово одинаковый результат.
+
+Входные float переводятся в целые тоже в заданном режиме и без ограничения
+по величине: берётся кратчайшая десятичная запись числа (repr), которая точно
+масштабируется и округляется до минорной единицы. Так 1.005 остаётся 1.005,
+а не 1.00499999... из двоичного представления.
+
+Промежуточные произведения в массивах при риске выхода за int64
+считаются в целых Python (dtype=object); результат обязан помещаться в int64,
+иначе поднимается OverflowError.
+"""
+from decimal import Decimal
+
+import numpy as np
+
+RATE_SCALE = 10 ** 6
+ROUNDING_MODES = ("half_up", "half_even", "down")
+_INT64_SAFE = 2 ** 62  # запас под 2 * r в round_div
+
+
+def _is_array(value) -> bool:
+    return isinstance(value, np.ndarray)
+
+
+def _abs_max(value) -> int:
+    if _is_array(value):
+        return int(np.max(np.abs(value), initial=0))
+    return abs(int(value))
+
+
+def _widen(value, *factors):
+    """Переводит массив в целые Python, если произведение может выйти за int64."""
+    if not _is_array(value) or value.dtype == object:
+        return value
+    bound = _abs_max(value)
+    for factor in factors:
+        bound *= _abs_max(factor)
+    if bound >= _INT64_SAFE:
+        return value.astype(object)
+    return value
+
+
+def _quantize_scalar(value, scale: int, mode: str) -> int:
+    num, den = (Decimal(repr(float(value))) * scale).as_integer_ratio()
+    return round_div(num, den, mode)
+
+
+def _quantize(value, scale: int, mode: str):
+    """Переводит float (или массив float) в целые единицы масштаба scale в режиме mode."""
+    if _is_array(value):
+        # Поэлементно тем же путём, что и скаляр; большие значения остаются целыми Python
+        minor = [_quantize_scalar(v, scale, mode) for v in value.ravel().tolist()]
+        dtype = np.int64 if max(map(abs, minor), default=0) < _INT64_SAFE else object
+        return np.array(minor, dtype=dtype).reshape(value.shape)
+    return _quantize_scalar(value, scale, mode)
+
+
+def to_minor(amount, digits: int = 2, mode: str = "half_up"):
+    """Переводит сумму (float или массив float) в минорные единицы."""
+    return _quantize(amount, 10 ** digits, mode)
+
+
+def from_minor(minor, digits: int = 2):
+    """Переводит минорные единицы обратно в float для ответа API."""
+    scale = 10 ** digits
+    if _is_array(minor):
+        return minor / scale
+    return int(minor) / scale
+
+
+def to_rate(rate, mode: str = "half_up"):
+    """Переводит ставку/коэффициент (float) в целое в масштабе RATE_SCALE."""
+    return _quantize(rate, RATE_SCALE, mode)
+
+
+def round_div(num, den, mode: str = "half_up"):
+    """
+    Целочисленное деление num / den (den > 0) с округлением:
+    half_up — половина от нуля, half_even — банковское, down — к нулю.
+    Работает одинаково для int и numpy-массивов.
+    """
+    q = num // den
+    r = num - q * den
+    if mode == "half_up":
+        q = q + ((2 * r > den) | ((2 * r == den) & (num >= 0)))
+    elif mode == "half_even":
+        q = q + ((2 * r > den) | ((2 * r == den) & (q % 2 == 1)))
+    elif mode == "down":
+        q = q + ((r != 0) & (num < 0))
+    else:
+        raise ValueError(f"Unknown rounding mode {mode}")
+    if _is_array(q):
+        return q.astype(np.int64)
+    return int(q)
+
+
+def mul_div(minor, numerators: list, denominator, mode: str = "half_up"):
+    """
+    Точно умножает сумму на произведение numerators и делит на denominator
+    с единственным округлением в конце.
+    """
+    num = _widen(minor, *numerators)
+    for factor in numerators:
+        num = num * factor
+    if _is_array(num) and num.dtype == object:
+        # Делитель тоже в целых Python: numpy не делит большие int на int64
+        denominator = denominator.astype(object) if _is_array(denominator) else int(denominator)
+    return round_div(num, denominator, mode)
+
+
+def apply_rate(minor, rate, mode: str = "half_up"):
+    """Умножает сумму в минорных единицах на ставку (float) с одним округлением."""
+    return mul_div(minor, [to_rate(rate, mode)], RATE_SCALE, mode)
+
+
+def ratio(num_minor, den_minor, digits: int = 2, multiplier: int = 1, mode: str = "half_up"):
+    """
+    Отношение двух сумм (num / den * multiplier) в масштабе 10**digits.
+    multiplier=100 даёт проценты.
+    """
+    return mul_div(num_minor, [multiplier * 10 ** digits], den_minor, mode)
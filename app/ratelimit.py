@@ -0,0 +1,241 @@
+"""
+Общее для всех воркеров uvicorn хранилище счётчиков rate limit.
+
+Счётчики лежат в mmap-файле фиксированного размера, поэтому все локальные
+процессы видят одни и те же значения, а память ограничена числом слотов.
+Хранилище регистрируется в библиотеке limits под схемой shm://, и slowapi
+использует его через storage_uri без изменений в декораторах.
+
+Таблица множественно-ассоциативная: ключ хэшируется в группу из WAYS слотов,
+проверка и инкремент — O(1). Если в группе нет свободного или истёкшего слота,
+вытесняется слот с ближайшим временем истечения.
+
+Ключ лимита — адрес клиента из X-Forwarded-For, если запрос пришёл от доверенного
+прокси (ingress), иначе адрес соединения.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from ipaddress import ip_address, ip_network
+from urllib.parse import urlparse
+
+import numpy as np
+from limits.storage import Storage
+from starlette.requests import Request
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировка только внутри процесса
+    fcntl = None
+
+MAGIC = b"PDNRL001"
+HEADER = struct.Struct("<8sIIQQ")  # magic, slots, ways, rejected, evictions
+HEADER_SIZE = 64
+SLOT = struct.Struct("<Qqd")  # fingerprint, count, expiry (unix time)
+SLOT_DTYPE = np.dtype([("fingerprint", "<u8"), ("count", "<i8"), ("expiry", "<f8")])
+WAYS = 4
+
+# Лимиты по маршрутам; переопределяются через переменные окружения
+RATE_LIMIT_STORAGE_URI = os.environ.get(
+    "PDN_RATE_LIMIT_STORAGE", "shm://" + os.path.join(tempfile.gettempdir(), "pdn_ratelimit.bin")
+)
+RATE_LIMIT_CALC = os.environ.get("PDN_RATE_LIMIT_CALC", "600/minute")
+RATE_LIMIT_ADMIN = os.environ.get("PDN_RATE_LIMIT_ADMIN", "60/minute")
+RATE_LIMIT_HEALTH = os.environ.get("PDN_RATE_LIMIT_HEALTH", "10/minute")
+
+# Сети прокси, которым доверяется X-Forwarded-For (по умолчанию loopback и частные сети кластера)
+TRUSTED_PROXIES = [
+    ip_network(net.strip())
+    for net in os.environ.get(
+        "PDN_TRUSTED_PROXIES", "127.0.0.0/8,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16,fc00::/7"
+    ).split(",")
+    if net.strip()
+]
+
+
+def _is_trusted_proxy(host: str) -> bool:
+    try:
+        address = ip_address(host)
+    except ValueError:
+        return False
+    return any(address in net for net in TRUSTED_PROXIES)
+
+
+def client_address(request: Request) -> str:
+    """
+    Ключ лимита: адрес клиента.
+    X-Forwarded-For разбирается справа налево, пока адреса принадлежат доверенным прокси;
+    первый недоверенный адрес и есть клиент. Заголовок от недоверенного соединения игнорируется.
+    """
+    host = request.client.host if request.client else "127.0.0.1"
+    if not _is_trusted_proxy(host):
+        return host
+    forwarded = ",".join(request.headers.getlist("x-forwarded-for"))
+    for hop in reversed([h.strip() for h in forwarded.split(",") if h.strip()]):
+        host = hop
+        if not _is_trusted_proxy(hop):
+            break
+    return host
+
+
+class SharedMemoryStorage(Storage):
+    """Хранилище limits для fixed-window лимитов в разделяемом mmap-файле."""
+
+    STORAGE_SCHEME = ["shm"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, slots: int = 65536, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.path = urlparse(uri).path or os.path.join(tempfile.gettempdir(), "pdn_ratelimit.bin")
+        self.slots = max(WAYS, int(slots) // WAYS * WAYS)
+        self.groups = self.slots // WAYS
+        self.size = HEADER_SIZE + self.slots * SLOT.size
+        self._thread_lock = threading.Lock()
+
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._locked(0, self.size):
+            magic, slots_in_file, ways_in_file = b"", 0, 0
+            if os.fstat(self._fd).st_size == self.size:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                magic, slots_in_file, ways_in_file, _, _ = HEADER.unpack(os.read(self._fd, HEADER.size))
+            if (magic, slots_in_file, ways_in_file) != (MAGIC, self.slots, WAYS):
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, self.size)
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                os.write(self._fd, HEADER.pack(MAGIC, self.slots, WAYS, 0, 0))
+        self._mm = mmap.mmap(self._fd, self.size)
+
+    @property
+    def base_exceptions(self):
+        return OSError, ValueError
+
+    # -----------------------
+    # Блокировки
+    # -----------------------
+    @contextmanager
+    def _locked(self, start: int, length: int):
+        """Блокирует диапазон байт файла для всех процессов (и потоков текущего)."""
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, length, start)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, length, start)
+
+    def _group(self, key: str):
+        fingerprint = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+        start = HEADER_SIZE + (fingerprint % self.groups) * WAYS * SLOT.size
+        return fingerprint, start
+
+    def _read_group(self, start: int):
+        return [SLOT.unpack_from(self._mm, start + i * SLOT.size) for i in range(WAYS)]
+
+    def _find(self, key: str):
+        """Возвращает (count, expiry) активного слота ключа или None."""
+        fingerprint, start = self._group(key)
+        now = time.time()
+        with self._locked(start, WAYS * SLOT.size):
+            for fp, count, expiry in self._read_group(start):
+                if fp == fingerprint and expiry > now:
+                    return count, expiry
+        return None
+
+    def _bump_header(self, field: int, amount: int = 1):
+        """Увеличивает счётчик в заголовке: 3 — rejected, 4 — evictions."""
+        with self._locked(0, HEADER_SIZE):
+            header = list(HEADER.unpack_from(self._mm, 0))
+            header[field] += amount
+            HEADER.pack_into(self._mm, 0, *header)
+
+    # -----------------------
+    # Интерфейс limits.storage.Storage
+    # -----------------------
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        fingerprint, start = self._group(key)
+        now = time.time()
+        evicted = False
+        with self._locked(start, WAYS * SLOT.size):
+            slots = self._read_group(start)
+            target, count = None, amount
+            for i, (fp, current, expires_at) in enumerate(slots):
+                if fp == fingerprint:
+                    target = i
+                    if expires_at > now:
+                        count = current + amount
+                    else:
+                        expires_at = now + expiry
+                    break
+            else:
+                free = [i for i, (fp, _, expires_at) in enumerate(slots) if fp == 0 or expires_at <= now]
+                if free:
+                    target = free[0]
+                else:
+                    target = min(range(WAYS), key=lambda i: slots[i][2])
+                    evicted = True
+                expires_at = now + expiry
+            SLOT.pack_into(self._mm, start + target * SLOT.size, fingerprint, count, expires_at)
+        if evicted:
+            self._bump_header(4)
+        return count
+
+    def get(self, key: str) -> int:
+        found = self._find(key)
+        return found[0] if found else 0
+
+    def get_expiry(self, key: str) -> float:
+        found = self._find(key)
+        return found[1] if found else time.time()
+
+    def check(self) -> bool:
+        return not self._mm.closed
+
+    def reset(self) -> int:
+        with self._locked(0, self.size):
+            cleared = sum(
+                1 for i in range(self.slots)
+                if SLOT.unpack_from(self._mm, HEADER_SIZE + i * SLOT.size)[0]
+            )
+            self._mm[HEADER_SIZE:self.size] = bytes(self.size - HEADER_SIZE)
+        return cleared
+
+    def clear(self, key: str) -> None:
+        fingerprint, start = self._group(key)
+        with self._locked(start, WAYS * SLOT.size):
+            for i, (fp, _, _) in enumerate(self._read_group(start)):
+                if fp == fingerprint:
+                    SLOT.pack_into(self._mm, start + i * SLOT.size, 0, 0, 0.0)
+
+    # -----------------------
+    # Мониторинг
+    # -----------------------
+    def record_rejection(self) -> None:
+        self._bump_header(3)
+
+    def stats(self) -> dict:
+        """
+        Сводка по таблице счётчиков для мониторинга.
+        Под блокировкой таблица только копируется, подсчёт идёт по снимку.
+        """
+        with self._locked(0, self.size):
+            snapshot = self._mm[:self.size]
+        _, slots, ways, rejected, evictions = HEADER.unpack_from(snapshot, 0)
+        table = np.frombuffer(snapshot, dtype=SLOT_DTYPE, offset=HEADER_SIZE, count=self.slots)
+        alive = (table["fingerprint"] != 0) & (table["expiry"] > time.time())
+        active = int(alive.sum())
+        hits = int(table["count"][alive].sum())
+        return {
+            "backend": "shm",
+            "capacity": slots,
+            "ways": ways,
+            "active_keys": active,
+            "hits_in_window": hits,
+            "rejected_total": rejected,
+            "evictions_total": evictions,
+        }
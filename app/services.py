@@ -8,6 +8,7 @@ from app.models import (
     MetaSchema,
 )
 from app.audit import log_request, log_response
+from app.money import RATE_SCALE, to_minor, from_minor, to_rate, mul_div, round_div, ratio
 
 
 def calculate_pdn(request: PDNRequestSchema):
@@ -20,62 +21,70 @@ def calculate_pdn(request: PDNRequestSchema):
     # Безопасное логирование входного запроса
     log_request(request.model_dump())
 
-    # Исходные значения
-    income_amount = request.income.amount
+    # Суммы считаются в целых минорных единицах (см. app.money)
+    digits = request.assumptions.rounding
+    mode = request.assumptions.rounding_mode or CONFIG["rounding"].get("mode", "half_up")
+    income_minor = to_minor(request.income.amount, digits, mode)
+    payment_shock = to_rate(1 + request.scenario.payment_shock_pct, mode)
     obligations_breakdown = []
+    obligations_minor = []
 
-    # Перевод периодичности платежей к месяцу (на будущее)
+    # Перевод периодичности платежей к месяцу (на будущее), точные дроби
     PERIOD_MAP = {
-        "monthly": 1,
-        "weekly": 4.345,   # 52 недели в год / 12 месяцев ≈ 4.345
-        "quarterly": 1 / 3,
-        "yearly": 1 / 12,
+        "monthly": (1, 1),
+        "weekly": (869, 200),   # 52 недели в год / 12 месяцев ≈ 4.345
+        "quarterly": (1, 3),
+        "yearly": (1, 12),
     }
 
-    # Расчёт обязательств
+    # Расчёт обязательств: платёж × ставка × период × шок, одно округление на строку
     for obl in request.obligations:
-        monthly = obl.monthly_payment
         period = getattr(obl, "period", "monthly")
-        period_factor = PERIOD_MAP.get(period, 1)
+        period_num, period_den = PERIOD_MAP.get(period, (1, 1))
+        rates = [payment_shock]
 
-        if monthly is None:
-            if obl.type == "credit_card":
-                rate = obl.min_payment_rate or request.assumptions.credit_card_default_min_rate
-                monthly = (obl.balance or 0) * rate
-            else:
-                monthly = obl.balance or 0
+        if obl.monthly_payment is not None:
+            amount = to_minor(obl.monthly_payment, digits, mode)
+        elif obl.type == "credit_card":
+            rate = obl.min_payment_rate or request.assumptions.credit_card_default_min_rate
+            amount = to_minor(obl.balance or 0, digits, mode)
+            rates.append(to_rate(rate, mode))
+        else:
+            amount = to_minor(obl.balance or 0, digits, mode)
 
-        # Нормализация к месяцу
-        monthly = monthly * period_factor
-
-        # Применение шока по сценарию
-        monthly *= 1 + request.scenario.payment_shock_pct
+        monthly = mul_div(amount, [period_num, *rates], period_den * RATE_SCALE ** len(rates), mode)
 
+        obligations_minor.append(monthly)
         obligations_breakdown.append({
             "id": getattr(obl, "id", None),
             "name": obl.name or obl.type,
-            "monthly": round(monthly, request.assumptions.rounding)
+            "monthly": from_minor(monthly, digits)
         })
 
     # Применение рефинансирования (по id, если есть)
     if request.scenario.mode == "target" and request.scenario.refinance:
         for ref in request.scenario.refinance:
-            for obl in obligations_breakdown:
+            for i, obl in enumerate(obligations_breakdown):
                 # Совпадение по id (если есть), иначе по имени (на всякий случай)
                 if (obl.get("id") and ref.id == obl["id"]) or ref.name == obl["name"]:
-                    new_payment = ref.monthly_payment or obl["monthly"]
-                    obl["monthly"] = round(new_payment, request.assumptions.rounding)
+                    if ref.monthly_payment:
+                        obligations_minor[i] = to_minor(ref.monthly_payment, digits, mode)
+                    obl["monthly"] = from_minor(obligations_minor[i], digits)
 
-    # Применяем шок по доходу
-    income_amount *= 1 + request.scenario.income_shock_pct
+    # Применяем шок по доходу; ПДН считается от точного дохода после шока
+    income_shock = to_rate(1 + request.scenario.income_shock_pct, mode)
+    income_scaled = income_minor * income_shock  # доход в масштабе RATE_SCALE
 
     # Защита от деления на ноль
-    if income_amount <= 0:
+    if income_scaled <= 0:
         raise ValueError("Income after shock is zero or negative — расчёт невозможен")
 
     # Итоговые значения
-    total_monthly = sum(o["monthly"] for o in obligations_breakdown)
-    pdn_percent = round((total_monthly / income_amount) * 100, request.assumptions.rounding)
+    total_minor = sum(obligations_minor)
+    total_monthly = from_minor(total_minor, digits)
+    pdn_percent = from_minor(
+        ratio(total_minor * RATE_SCALE, income_scaled, digits, multiplier=100, mode=mode), digits
+    )
     risk_band = get_risk_band(pdn_percent)
 
     advice = (
@@ -89,7 +98,7 @@ def calculate_pdn(request: PDNRequestSchema):
         "calc_version": CONFIG["version"],
         "currency": request.income.currency,
         "monthly_obligations_total": total_monthly,
-        "monthly_income_used": round(income_amount, request.assumptions.rounding),
+        "monthly_income_used": from_minor(round_div(income_scaled, RATE_SCALE, mode), digits),
         "pdn_percent": pdn_percent,
         "risk_band": risk_band,
         "breakdown": obligations_breakdown,
@@ -112,14 +121,23 @@ def calc_business_metrics(data: BusinessInput) -> BusinessResult:
     Расчёт метрик долговой нагрузки для бизнеса (DCR и ПДН бизнеса).
     """
 
-    monthly_debt_service = round(data.interest + data.principal, 2)
-    cash_flow_proxy = round(data.ebitda - (data.taxes or 0), 2)
+    # Конфиг обновляется через админку целиком по ключам, поэтому новые поля читаются с умолчаниями
+    money_digits = CONFIG["rounding"].get("money", 2)
+    percent_digits = CONFIG["rounding"]["percent"]
+    mode = CONFIG["rounding"].get("mode", "half_up")
 
-    if monthly_debt_service <= 0 or cash_flow_proxy <= 0:
+    debt_service_minor = to_minor(data.interest, money_digits, mode) + to_minor(data.principal, money_digits, mode)
+    cash_flow_minor = to_minor(data.ebitda, money_digits, mode) - to_minor(data.taxes or 0, money_digits, mode)
+
+    if debt_service_minor <= 0 or cash_flow_minor <= 0:
         raise ValueError("Некорректные данные для расчёта DCR")
 
-    dcr = round(cash_flow_proxy / monthly_debt_service, CONFIG["rounding"]["percent"])
-    pdn_business = round((monthly_debt_service / cash_flow_proxy) * 100, CONFIG["rounding"]["percent"])
+    monthly_debt_service = from_minor(debt_service_minor, money_digits)
+    cash_flow_proxy = from_minor(cash_flow_minor, money_digits)
+    dcr = from_minor(ratio(cash_flow_minor, debt_service_minor, percent_digits, mode=mode), percent_digits)
+    pdn_business = from_minor(
+        ratio(debt_service_minor, cash_flow_minor, percent_digits, multiplier=100, mode=mode), percent_digits
+    )
     risk_band = get_risk_band(pdn_business)
 
     advice = {
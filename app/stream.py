@@ -0,0 +1,129 @@
+"""
+Потоковый бинарный протокол для внутренних высоконагруженных клиентов.
+
+Кадр: 4 байта длины (big-endian, unsigned) + тело в MessagePack.
+Запрос:  {"route": "pdn" | "business", "payload": {...}}
+Ответ:   {"status": 200, "body": {...}} или {"status": 4xx/5xx, "detail": ...}
+
+Соединение держится открытым, кадры обрабатываются последовательно.
+Запуск: python -m app.stream (адрес задаётся через PDN_STREAM_HOST / PDN_STREAM_PORT).
+"""
+import asyncio
+import os
+import struct
+
+from pydantic import ValidationError
+
+from app.models import PDNRequestSchema, BusinessInput
+from app.services import calculate_pdn, calc_business_metrics
+from app.history import history, pdn_record, business_record
+from app.transport import packb, unpackb
+
+HEADER = struct.Struct(">I")
+MAX_FRAME_SIZE = 1024 * 1024  # 1 MiB — защита от некорректной длины кадра
+
+
+def encode_frame(data) -> bytes:
+    """Упаковывает объект в кадр с префиксом длины."""
+    body = packb(data)
+    return HEADER.pack(len(body)) + body
+
+
+async def read_frame(reader: asyncio.StreamReader):
+    """
+    Читает один кадр из потока.
+    Возвращает None, если клиент закрыл соединение.
+    """
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError:
+        return None
+    (length,) = HEADER.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise ValueError(f"Frame too large: {length} bytes")
+    return unpackb(await reader.readexactly(length))
+
+
+def handle_message(message) -> dict:
+    """
+    Выполняет расчёт по одному сообщению протокола.
+    Коды статусов совпадают с HTTP-эндпоинтами /pdn/calc и /pdn/calc/business.
+    """
+    if not isinstance(message, dict):
+        return {"status": 400, "detail": "Message must be a map"}
+
+    route = message.get("route", "pdn")
+    payload = message.get("payload")
+
+    if route == "pdn":
+        try:
+            request = PDNRequestSchema.model_validate(payload)
+        except ValidationError as ve:
+            return {"status": 422, "detail": ve.errors(include_url=False, include_context=False)}
+        try:
+            result = calculate_pdn(request)
+            history.record(pdn_record(request, result))
+            return {"status": 200, "body": result}
+        except ValueError as ve:
+            return {"status": 400, "detail": str(ve)}
+        except Exception:
+            return {"status": 500, "detail": "Internal calculation error"}
+
+    if route == "business":
+        try:
+            data = BusinessInput.model_validate(payload)
+        except ValidationError as ve:
+            return {"status": 422, "detail": ve.errors(include_url=False, include_context=False)}
+        try:
+            result = calc_business_metrics(data)
+            history.record(business_record(data, result))
+            return {"status": 200, "body": result.model_dump()}
+        except ValueError as ve:
+            return {"status": 422, "detail": str(ve)}
+        except Exception:
+            return {"status": 500, "detail": "Internal calculation error"}
+
+    return {"status": 404, "detail": f"Unknown route {route}"}
+
+
+async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            try:
+                message = await read_frame(reader)
+            except asyncio.IncompleteReadError:
+                break
+            except Exception:
+                writer.write(encode_frame({"status": 400, "detail": "Malformed frame"}))
+                await writer.drain()
+                break
+            if message is None:
+                break
+            # Расчёт и аудит блокируют поток, поэтому выполняются вне event loop
+            reply = await asyncio.to_thread(handle_message, message)
+            writer.write(encode_frame(reply))
+            await writer.drain()
+    except ConnectionResetError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host: str = "127.0.0.1", port: int = 8001) -> asyncio.AbstractServer:
+    """Запускает TCP-сервер потокового протокола."""
+    return await asyncio.start_server(handle_connection, host, port)
+
+
+async def _main():
+    host = os.environ.get("PDN_STREAM_HOST", "127.0.0.1")
+    port = int(os.environ.get("PDN_STREAM_PORT", "8001"))
+    server = await serve(host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        history.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,119 @@
+import asyncio
+from typing import Optional, Type
+
+import msgpack
+from fastapi import Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, ValidationError
+
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+MSGPACK_MEDIA_TYPES = ("application/x-msgpack", "application/msgpack", "application/vnd.msgpack")
+
+
+def is_msgpack(content_type: Optional[str]) -> bool:
+    """Проверяет, что заголовок Content-Type/Accept указывает на MessagePack."""
+    if not content_type:
+        return False
+    return any(media in content_type for media in MSGPACK_MEDIA_TYPES)
+
+
+def packb(data) -> bytes:
+    """Кодирует ответ в MessagePack."""
+    return msgpack.packb(data, use_bin_type=True)
+
+
+def unpackb(body: bytes):
+    """Декодирует тело запроса из MessagePack."""
+    return msgpack.unpackb(body, raw=False)
+
+
+class MsgPackResponse(Response):
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def render(self, content) -> bytes:
+        return packb(content)
+
+
+def render(request: Request, content, headers: Optional[dict] = None, status_code: int = 200) -> Response:
+    """
+    Возвращает ответ в формате, запрошенном клиентом через Accept:
+    MessagePack для внутренних клиентов, иначе JSON.
+    """
+    if is_msgpack(request.headers.get("accept")):
+        return MsgPackResponse(content=content, headers=headers, status_code=status_code)
+    return JSONResponse(content=content, headers=headers, status_code=status_code)
+
+
+def msgpack_body(param: str, model: Type[BaseModel]):
+    """
+    Разрешает эндпоинту принимать тело в MessagePack: тело валидируется в model
+    и передаётся в параметр param. Эндпоинт должен принимать request: Request
+    и не иметь зависимостей (Depends) — MsgPackRoute отказывается регистрировать такой маршрут.
+    """
+    def decorator(func):
+        func.msgpack_body = (param, model)
+        return func
+    return decorator
+
+
+class MsgPackRoute(APIRoute):
+    """
+    Маршрут, принимающий тело запроса в MessagePack наравне с JSON.
+    JSON обрабатывается штатно FastAPI. Тело MessagePack декодируется,
+    валидируется через model_validate и передаётся эндпоинту напрямую,
+    минуя разбор запроса FastAPI, поэтому зависимости на маршруте запрещены.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        body = getattr(endpoint, "msgpack_body", None)
+        if body is not None:
+            # Тело MessagePack описывается той же схемой, что и JSON
+            _, model = body
+            extra = kwargs.get("openapi_extra") or {}
+            content = extra.setdefault("requestBody", {}).setdefault("content", {})
+            content[MSGPACK_MEDIA_TYPE] = {"schema": {"$ref": f"#/components/schemas/{model.__name__}"}}
+            kwargs["openapi_extra"] = extra
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self):
+        original_handler = super().get_route_handler()
+        body = getattr(self.endpoint, "msgpack_body", None)
+        if body is None:
+            return original_handler
+        if self.dependant.dependencies:
+            raise RuntimeError(
+                f"Route {self.path} accepts MessagePack and cannot have dependencies: "
+                "they are not resolved for MessagePack bodies"
+            )
+
+        param, model = body
+        endpoint = self.endpoint
+        is_coroutine = asyncio.iscoroutinefunction(endpoint)
+
+        async def handler(request: Request) -> Response:
+            if not is_msgpack(request.headers.get("content-type")):
+                return await original_handler(request)
+            try:
+                decoded = unpackb(await request.body())
+            except Exception:
+                return render(request, {"detail": "Malformed MessagePack body"}, status_code=400)
+            try:
+                data = model.model_validate(decoded)
+            except ValidationError as ve:
+                raise RequestValidationError(ve.errors(include_url=False, include_context=False))
+
+            kwargs = {param: data, "request": request}
+            if is_coroutine:
+                result = await endpoint(**kwargs)
+            else:
+                result = await run_in_threadpool(endpoint, **kwargs)
+            if isinstance(result, Response):
+                return result
+            if isinstance(result, BaseModel):
+                result = result.model_dump(mode="json")
+            return render(request, result)
+
+        return handler
@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# Пути хранилищ читаются при импорте app.*, поэтому задаются до него
+_tmp_dir = tempfile.mkdtemp(prefix="pdn-tests-")
+os.environ.setdefault("PDN_HISTORY_DB", os.path.join(_tmp_dir, "pdn_history.db"))
+os.environ.setdefault("PDN_RATE_LIMIT_STORAGE", "shm://" + os.path.join(_tmp_dir, "pdn_ratelimit.bin"))
@@ -1,6 +1,12 @@
+from datetime import datetime, timezone
+import msgpack
 import pytest
+from fastapi import APIRouter, Depends, Request
 from fastapi.testclient import TestClient
 from app.main import app
+from app.auth import require_admin
+from app.transport import MsgPackRoute, msgpack_body
+from app.models import CONFIG, BusinessInput
 
 client = TestClient(app)
 
@@ -33,3 +39,161 @@ def test_audit_endpoint():
     assert r.status_code == 200
     data = r.json()
     assert "logs" in data
+
+def test_pdn_calc_msgpack():
+    payload = {
+        "subject_type": "individual",
+        "period_months": 6,
+        "income": {"amount": 120000, "currency": "RUB", "income_type": "net", "source": "salary"},
+        "obligations": [
+            {"type": "loan", "monthly_payment": 25000, "currency": "RUB", "name": "Ипотека"}
+        ],
+        "scenario": {"mode": "base", "income_shock_pct": 0, "payment_shock_pct": 0, "refinance": None},
+        "meta": {"client_id": "abc-123", "request_id": "req-msgpack"}
+    }
+    r = client.post(
+        "/pdn/calc",
+        content=msgpack.packb(payload),
+        headers={"Content-Type": "application/x-msgpack", "Accept": "application/x-msgpack"},
+    )
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/x-msgpack"
+    data = msgpack.unpackb(r.content)
+    expected = client.post("/pdn/calc", json=payload).json()
+    assert data["pdn_percent"] == expected["pdn_percent"]
+    assert data["breakdown"] == expected["breakdown"]
+
+def test_pdn_calc_msgpack_validation_error():
+    r = client.post(
+        "/pdn/calc",
+        content=msgpack.packb({"income": {"amount": -1000, "currency": "RUB"}}),
+        headers={"Content-Type": "application/x-msgpack"},
+    )
+    assert r.status_code == 422
+
+def test_msgpack_malformed_body():
+    r = client.post("/pdn/calc", content=b"\xc1", headers={"Content-Type": "application/x-msgpack"})
+    assert r.status_code == 400
+
+def test_msgpack_route_rejects_dependencies():
+    router = APIRouter(route_class=MsgPackRoute)
+    with pytest.raises(RuntimeError):
+        @router.post("/guarded")
+        @msgpack_body("data", BusinessInput)
+        def guarded(data: BusinessInput, request: Request, _: None = Depends(require_admin)):
+            return {}
+
+def test_openapi_declares_msgpack_body():
+    content = app.openapi()["paths"]["/pdn/calc"]["post"]["requestBody"]["content"]
+    assert content["application/x-msgpack"] == content["application/json"]
+
+def test_business_calc_msgpack_json_response():
+    payload = {"ebitda": 500000, "interest": 50000, "principal": 100000, "meta": {"client_id": "biz-1"}}
+    r = client.post(
+        "/pdn/calc/business",
+        content=msgpack.packb(payload),
+        headers={"Content-Type": "application/x-msgpack"},
+    )
+    assert r.status_code == 200
+    assert r.json() == client.post("/pdn/calc/business", json=payload).json() | {"meta": r.json()["meta"]}
+
+def test_business_calc_msgpack():
+    payload = {"ebitda": 500000, "interest": 50000, "principal": 100000, "meta": {"client_id": "biz-1"}}
+    r = client.post(
+        "/pdn/calc/business",
+        content=msgpack.packb(payload),
+        headers={"Content-Type": "application/x-msgpack", "Accept": "application/x-msgpack"},
+    )
+    assert r.status_code == 200
+    data = msgpack.unpackb(r.content)
+    assert data["risk_band"] in ["LOW", "MID", "HIGH"]
+
+def test_business_calc_large_ebitda():
+    payload = {"ebitda": 1e11, "interest": 1e9, "principal": 2e9, "meta": {"client_id": "corp-1"}}
+    r = client.post("/pdn/calc/business", json=payload)
+    assert r.status_code == 200
+    data = r.json()
+    assert data["cash_flow_proxy"] == 1e11
+    assert data["monthly_debt_service"] == 3e9
+    assert data["pdn_business_percent"] == 3.0
+
+@pytest.mark.parametrize("amount, rounding", [(1e12, 2), (1e9, 4)])
+def test_pdn_calc_large_income(amount, rounding):
+    payload = {
+        "income": {"amount": amount, "currency": "RUB"},
+        "obligations": [{"type": "loan", "monthly_payment": amount / 4, "name": "Ипотека"}],
+        "scenario": {"mode": "base"},
+        "assumptions": {"rounding": rounding},
+        "meta": {"client_id": "abc-123", "request_id": "req-large"}
+    }
+    r = client.post("/pdn/calc", json=payload)
+    assert r.status_code == 200
+    assert r.json()["monthly_income_used"] == amount
+    assert r.json()["pdn_percent"] == 25.0
+
+def test_config_update_without_rounding_mode():
+    saved = CONFIG["rounding"]
+    try:
+        # Формат rounding до появления режима округления
+        r = client.post(
+            "/admin/pdn/config",
+            json={"rounding": {"money": 2, "percent": 2}},
+            headers={"x-api-key": "secret-admin-key"},
+        )
+        assert r.status_code == 200
+        payload = {
+            "income": {"amount": 100000, "currency": "RUB"},
+            "obligations": [{"type": "loan", "monthly_payment": 10000.5, "name": "Ипотека"}],
+            "scenario": {"mode": "base"},
+            "meta": {"client_id": "abc-123", "request_id": "req-config"}
+        }
+        r = client.post("/pdn/calc", json=payload)
+        assert r.status_code == 200
+        assert r.json()["monthly_obligations_total"] == 10000.5
+    finally:
+        CONFIG["rounding"] = saved
+
+def test_history_analytics_endpoints():
+    assert client.get("/admin/pdn/analytics/bands").status_code == 422
+    headers = {"x-api-key": "secret-admin-key"}
+    payload = {
+        "income": {"amount": 100000, "currency": "USD"},
+        "obligations": [{"type": "loan", "monthly_payment": 85000, "name": "Ипотека"}],
+        "scenario": {"mode": "base"},
+        "meta": {"client_id": "abc-123", "request_id": "req-history"}
+    }
+    assert client.post("/pdn/calc", json=payload).status_code == 200
+    r = client.get("/admin/pdn/history", params={"request_id": "req-history"}, headers=headers)
+    assert r.status_code == 200
+    results = r.json()["results"]
+    assert len(results) == 1
+    assert results[0]["risk_band"] == "HIGH"
+    today = datetime.now(timezone.utc).date().isoformat()
+    r = client.get(
+        "/admin/pdn/analytics/bands",
+        params={"date_from": today, "date_to": today, "currency": "USD"},
+        headers=headers,
+    )
+    assert r.status_code == 200
+    assert r.json() == {"total": 1, "bands": {"HIGH": {"count": 1, "share": 1.0}}}
+    r = client.get("/admin/pdn/analytics", params={"date_from": "2025-1-5"}, headers=headers)
+    assert r.status_code == 422
+
+def test_rate_limit_shared_counters():
+    statuses = [client.get("/health").status_code for _ in range(11)]
+    assert 429 in statuses
+    r = client.get("/admin/pdn/ratelimit", headers={"x-api-key": "secret-admin-key"})
+    assert r.status_code == 200
+    data = r.json()
+    assert data["backend"] == "shm"
+    assert data["rejected_total"] >= 1
+    assert data["active_keys"] >= 1
+    assert data["limits"]["calc"] == "600/minute"
+
+def test_rate_limit_keyed_by_forwarded_client():
+    # Запросы приходят через ingress из частной сети, клиенты различаются по X-Forwarded-For
+    ingress = TestClient(app, client=("10.0.0.2", 50000))
+    first = [ingress.get("/health", headers={"X-Forwarded-For": "203.0.113.7"}).status_code for _ in range(11)]
+    assert first[:10] == [200] * 10
+    assert first[10] == 429
+    assert ingress.get("/health", headers={"X-Forwarded-For": "203.0.113.8"}).status_code == 200
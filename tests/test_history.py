@@ -0,0 +1,97 @@
+import time
+from datetime import date
+import pytest
+from app.history import HistoryRecorder, ResultStore, SQLiteResultStore, make_record
+
+def make(band, mode="base", currency="RUB", day="2025-10-20", pdn=40.0, request_id="req"):
+    return make_record(
+        request_id=request_id,
+        ts=f"{day}T10:00:00+00:00",
+        calc_version="v1.0",
+        scenario_mode=mode,
+        currency=currency,
+        risk_band=band,
+        pdn_percent=pdn,
+        monthly_income_used=100000,
+        monthly_obligations_total=pdn * 1000,
+        breakdown=[{"id": None, "name": "loan", "monthly": pdn * 1000}],
+    )
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+@pytest.fixture
+def recorder(tmp_path):
+    recorder = HistoryRecorder(SQLiteResultStore(str(tmp_path / "history.db")), batch_size=3, max_delay=60)
+    yield recorder
+    recorder.close()
+
+def test_batched_writes(recorder):
+    recorder.record(make("LOW"))
+    recorder.record(make("HIGH", pdn=85.0))
+    assert recorder.store.get_results() == []
+    recorder.record(make("LOW", request_id="req-3"))
+    wait_for(lambda: len(recorder.store.get_results()) == 3)
+    assert recorder.store.get_results(request_id="req-3")[0]["breakdown"][0]["name"] == "loan"
+
+def test_rollups_incremental(recorder):
+    for band in ["LOW", "LOW", "HIGH", "LOW"]:
+        recorder.record(make(band))
+    rollups = recorder.rollups(risk_band="LOW")
+    assert len(rollups) == 1
+    assert rollups[0]["count"] == 3
+    assert rollups[0]["pdn_percent_sum"] == pytest.approx(120.0)
+
+def test_band_shares(recorder):
+    recorder.record(make("HIGH", pdn=90.0, day="2025-10-20"))
+    recorder.record(make("LOW", day="2025-10-21"))
+    recorder.record(make("LOW", day="2025-10-21", currency="USD"))
+    recorder.record(make("HIGH", pdn=90.0, day="2025-10-01"))
+    shares = recorder.band_shares(date_from=date(2025, 10, 20), date_to=date(2025, 10, 26))
+    assert shares["total"] == 3
+    assert shares["bands"]["HIGH"]["share"] == pytest.approx(0.3333)
+    assert recorder.band_shares(currency="USD")["bands"] == {"LOW": {"count": 1, "share": 1.0}}
+
+def test_flush_by_timer(tmp_path):
+    recorder = HistoryRecorder(SQLiteResultStore(str(tmp_path / "history.db")), batch_size=100, max_delay=0.05)
+    recorder.record(make("LOW"))
+    wait_for(lambda: len(recorder.store.get_results()) == 1)
+    recorder.close()
+
+def test_store_error_keeps_batch(tmp_path):
+    store = SQLiteResultStore(str(tmp_path / "history.db"))
+    recorder = HistoryRecorder(store, batch_size=100, max_delay=60)
+    write_batch = store.write_batch
+
+    def failing(records, rollups):
+        raise RuntimeError("database is locked")
+
+    store.write_batch = failing
+    recorder.record(make("LOW"))
+    recorder.record(make("HIGH", pdn=85.0))
+    assert recorder.flush() == 0
+    store.write_batch = write_batch
+    assert recorder.flush() == 2
+    assert len(store.get_results()) == 2
+    recorder.close()
+
+def test_store_interface_is_abstract():
+    class PartialStore(ResultStore):
+        def write_batch(self, records, rollups):
+            pass
+
+    with pytest.raises(TypeError):
+        PartialStore()
+
+def test_store_opened_lazily_and_closed(tmp_path):
+    path = tmp_path / "history.db"
+    recorder = HistoryRecorder(SQLiteResultStore(str(path)), batch_size=100, max_delay=60)
+    assert not path.exists()
+    recorder.record(make("LOW"))
+    recorder.close()
+    assert path.exists()
+    assert recorder.store._conn is None
+    assert len(SQLiteResultStore(str(path)).get_results()) == 1
@@ -1,4 +1,8 @@
+import json
+import msgpack
 import pytest
+from fastapi.testclient import TestClient
+from app.main import app, limiter
 from app.services import calculate_pdn
 from app.models import PDNRequestSchema
 
@@ -15,7 +19,37 @@ def make_request():
         "meta": {"client_id": "abc-123", "request_id": "req-load"}
     })
 
+@pytest.fixture
+def no_rate_limit():
+    # Бенчмарк HTTP делает больше запросов, чем допускает лимит расчётов
+    limiter.enabled = False
+    yield
+    limiter.enabled = True
+
 def test_pdn_perf(benchmark):
     req = make_request()
     result = benchmark(lambda: calculate_pdn(req))
     assert result["pdn_percent"] > 0
+
+def test_json_decode_perf(benchmark):
+    body = json.dumps(make_request().model_dump()).encode()
+    result = benchmark(lambda: PDNRequestSchema.model_validate(json.loads(body)))
+    assert result.income.amount == 120000
+
+def test_msgpack_decode_perf(benchmark):
+    body = msgpack.packb(make_request().model_dump())
+    result = benchmark(lambda: PDNRequestSchema.model_validate(msgpack.unpackb(body)))
+    assert result.income.amount == 120000
+
+def test_json_http_perf(benchmark, no_rate_limit):
+    client = TestClient(app)
+    payload = make_request().model_dump()
+    r = benchmark(lambda: client.post("/pdn/calc", json=payload))
+    assert r.status_code == 200
+
+def test_msgpack_http_perf(benchmark, no_rate_limit):
+    client = TestClient(app)
+    body = msgpack.packb(make_request().model_dump())
+    headers = {"Content-Type": "application/x-msgpack", "Accept": "application/x-msgpack"}
+    r = benchmark(lambda: client.post("/pdn/calc", content=body, headers=headers))
+    assert r.status_code == 200
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from app.money import apply_rate, from_minor, mul_div, ratio, round_div, to_minor
+
+@pytest.mark.parametrize("mode, expected", [
+    ("half_up", [3, -3, 2, -2, 2, 4]),
+    ("half_even", [2, -2, 2, -2, 2, 4]),
+    ("down", [2, -2, 2, -2, 1, 3]),
+])
+def test_round_div_modes(mode, expected):
+    nums = [5, -5, 4, -4, 3, 7]
+    assert [round_div(n, 2, mode) for n in nums] == expected
+    assert round_div(np.array(nums, dtype=np.int64), 2, mode).tolist() == expected
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        round_div(1, 2, "ceil")
+
+def test_scalar_and_batch_bit_identical():
+    rng = np.random.default_rng(42)
+    amounts = rng.uniform(0, 1_000_000, 1000).round(2)
+    rates = rng.uniform(-0.5, 1.0, 1000)
+    incomes = rng.uniform(10_000, 500_000, 1000).round(2)
+
+    minor = to_minor(amounts)
+    shocked = apply_rate(minor, 1 + rates)
+    quarterly = mul_div(shocked, [1], 3)
+    pdn = ratio(quarterly, to_minor(incomes), multiplier=100)
+
+    for i in range(len(amounts)):
+        s_minor = to_minor(float(amounts[i]))
+        s_shocked = apply_rate(s_minor, 1 + float(rates[i]))
+        s_quarterly = mul_div(s_shocked, [1], 3)
+        s_pdn = ratio(s_quarterly, to_minor(float(incomes[i])), multiplier=100)
+        assert s_minor == minor[i]
+        assert s_shocked == shocked[i]
+        assert s_pdn == pdn[i]
+    assert from_minor(pdn).tolist() == [from_minor(int(p)) for p in pdn]
+
+def test_no_float_drift():
+    # 0.1 + 0.2 в float даёт 0.30000000000000004
+    total = to_minor(0.1) + to_minor(0.2)
+    assert from_minor(total) == 0.3
+    # 1.005 * 100 в float = 100.49999..., ввод берётся по десятичной записи
+    assert to_minor(1.005) == 101
+    assert to_minor(1.005, mode="half_even") == 100
+
+@pytest.mark.parametrize("mode, expected", [("half_up", 11), ("half_even", 10), ("down", 10)])
+def test_input_quantization_follows_mode(mode, expected):
+    assert to_minor(10.5, 0, mode) == expected
+    assert to_minor(np.array([10.5]), 0, mode).tolist() == [expected]
+
+def test_large_products_do_not_wrap():
+    # 20 млн при 6 знаках: минорные × RATE_SCALE выходят за int64
+    minor = 20_000_000 * 10 ** 6
+    expected = apply_rate(minor, 1.1)
+    assert expected == 22_000_000 * 10 ** 6
+    assert apply_rate(np.array([minor], dtype=np.int64), np.array([1.1])).tolist() == [expected]
+    assert mul_div(np.array([minor], dtype=np.int64), [10 ** 6, 10 ** 6], 10 ** 12).tolist() == [minor]
+
+def test_large_inputs_are_exact():
+    assert to_minor(1e11) == 10 ** 13
+    assert to_minor(1e12, 4) == 10 ** 16
+    assert to_minor(123456789012345.67) == 12345678901234567
+    assert to_minor(np.array([1e20, 1.5])).tolist() == [10 ** 22, 150]
+
+def test_out_of_range():
+    with pytest.raises(OverflowError):
+        mul_div(np.array([2 ** 62], dtype=np.int64), [4], 1)
@@ -0,0 +1,64 @@
+import multiprocessing
+import os
+import time
+import pytest
+from limits.storage import storage_from_string
+from starlette.requests import Request
+from app.ratelimit import SharedMemoryStorage, client_address
+
+def make_storage(path, slots=64):
+    return storage_from_string(f"shm://{path}", slots=slots)
+
+def _worker(path, hits):
+    storage = make_storage(path)
+    for _ in range(hits):
+        storage.incr("LIMITER/127.0.0.1/pdn_calc", 60)
+
+def test_incr_and_expiry(tmp_path):
+    storage = make_storage(tmp_path / "rl.bin")
+    assert isinstance(storage, SharedMemoryStorage)
+    assert storage.incr("key", 1) == 1
+    assert storage.incr("key", 1) == 2
+    assert storage.get("key") == 2
+    storage.clear("key")
+    assert storage.get("key") == 0
+    storage.incr("short", 0.05)
+    time.sleep(0.1)
+    assert storage.get("short") == 0
+    assert storage.incr("short", 60) == 1
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="требуется fork")
+def test_shared_between_processes(tmp_path):
+    path = tmp_path / "rl.bin"
+    make_storage(path)
+    ctx = multiprocessing.get_context("fork")
+    workers = [ctx.Process(target=_worker, args=(path, 200)) for _ in range(4)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    assert make_storage(path).get("LIMITER/127.0.0.1/pdn_calc") == 800
+
+def test_bounded_memory(tmp_path):
+    storage = make_storage(tmp_path / "rl.bin", slots=16)
+    for i in range(1000):
+        storage.incr(f"client-{i}", 60)
+    stats = storage.stats()
+    assert stats["capacity"] == 16
+    assert stats["active_keys"] == 16
+    assert stats["evictions_total"] == 1000 - 16
+
+def make_request(peer, forwarded=None):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "client": (peer, 50000), "headers": headers})
+
+@pytest.mark.parametrize("peer, forwarded, expected", [
+    ("203.0.113.7", None, "203.0.113.7"),
+    ("203.0.113.7", "198.51.100.1", "203.0.113.7"),  # недоверенное соединение: заголовок игнорируется
+    ("10.0.0.2", "198.51.100.1", "198.51.100.1"),
+    ("10.0.0.2", "198.51.100.9, 198.51.100.1, 10.0.0.3", "198.51.100.1"),
+    ("10.0.0.2", "10.0.0.5", "10.0.0.5"),
+    ("10.0.0.2", None, "10.0.0.2"),
+])
+def test_client_address(peer, forwarded, expected):
+    assert client_address(make_request(peer, forwarded)) == expected
@@ -47,3 +47,28 @@ def test_risk_thresholds():
     req = make_request({"income": {"amount": 100000, "currency": "RUB", "income_type": "net", "source": "salary"}})
     result = calculate_pdn(req)
     assert result["risk_band"] == "MID"
+
+def test_totals_consistent_with_breakdown():
+    req = make_request({
+        "obligations": [
+            {"type": "loan", "monthly_payment": 0.1, "name": "A"},
+            {"type": "loan", "monthly_payment": 0.2, "name": "B"},
+            {"type": "credit_card", "balance": 333.33, "min_payment_rate": 0.05, "name": "Visa"},
+        ],
+        "assumptions": {"credit_card_default_min_rate": 0.05, "rounding": 2, "rounding_mode": "half_even"},
+    })
+    result = calculate_pdn(req)
+    # 333.33 * 0.05 = 16.6665 → 16.67, итог равен сумме строк без дрейфа float
+    assert [o["monthly"] for o in result["breakdown"]] == [0.1, 0.2, 16.67]
+    assert result["monthly_obligations_total"] == 16.97
+
+@pytest.mark.parametrize("rounding, mode, expected", [(2, "half_up", 18.33), (0, "down", 18.0)])
+def test_single_rounding_per_line(rounding, mode, expected):
+    # 333.33 * 0.05 * 1.1 = 18.33315 — округляется один раз
+    req = make_request({
+        "obligations": [{"type": "credit_card", "balance": 333.33, "min_payment_rate": 0.05, "name": "Visa"}],
+        "scenario": {"mode": "stress", "income_shock_pct": 0, "payment_shock_pct": 0.1, "refinance": None},
+        "assumptions": {"credit_card_default_min_rate": 0.05, "rounding": rounding, "rounding_mode": mode},
+    })
+    result = calculate_pdn(req)
+    assert result["breakdown"][0]["monthly"] == expected
@@ -0,0 +1,44 @@
+import asyncio
+import msgpack
+from app.stream import HEADER, encode_frame, handle_message, serve
+
+PAYLOAD = {
+    "subject_type": "individual",
+    "period_months": 6,
+    "income": {"amount": 120000, "currency": "RUB", "income_type": "net", "source": "salary"},
+    "obligations": [
+        {"type": "loan", "monthly_payment": 25000, "currency": "RUB", "name": "Ипотека"}
+    ],
+    "scenario": {"mode": "base", "income_shock_pct": 0, "payment_shock_pct": 0, "refinance": None},
+    "meta": {"client_id": "abc-123", "request_id": "req-stream"}
+}
+
+def test_handle_message_pdn():
+    reply = handle_message({"route": "pdn", "payload": PAYLOAD})
+    assert reply["status"] == 200
+    assert reply["body"]["pdn_percent"] > 0
+
+def test_handle_message_errors():
+    assert handle_message({"route": "pdn", "payload": {"income": {}}})["status"] == 422
+    assert handle_message({"route": "unknown", "payload": {}})["status"] == 404
+    assert handle_message([1, 2, 3])["status"] == 400
+
+def test_stream_roundtrip():
+    async def scenario():
+        server = await serve("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        replies = []
+        for _ in range(2):
+            writer.write(encode_frame({"route": "pdn", "payload": PAYLOAD}))
+            await writer.drain()
+            (length,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+            replies.append(msgpack.unpackb(await reader.readexactly(length)))
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return replies
+
+    replies = asyncio.run(scenario())
+    assert [r["status"] for r in replies] == [200, 200]
+    assert replies[0]["body"]["pdn_percent"] == replies[1]["body"]["pdn_percent"]